@@ -113,7 +113,8 @@ def evaluate_response(state: AgentState):
         "response": response_text,
         "confidence": confidence,
         "email": state["author_email"],
-        "platform": state["platform"]
+        "platform": state["platform"],
+        "sender_id": state["sender_id"]
     })
     
     if confidence < 0.80:
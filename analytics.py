@@ -0,0 +1,122 @@
+import os
+import argparse
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+from supabase.client import Client, create_client
+
+
+load_dotenv()
+supabase_url = os.environ.get("SUPABASE_URL")
+supabase_key = os.environ.get("SUPABASE_SERVICE_KEY")
+supabase: Client = create_client(supabase_url, supabase_key)
+
+
+def get_daily_rollups(days: int = 30, platform: Optional[str] = None, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """Read pre-aggregated bot_logs_daily rows; never touches the raw bot_logs table"""
+    since = (date.today() - timedelta(days=days - 1)).isoformat()
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table("bot_logs_daily").select("*").gte("day", since).order("day").order("platform")
+        if platform:
+            query = query.eq("platform", platform)
+        page = query.range(start, start + page_size - 1).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold rollup rows into per-day, per-platform and overall volume / handover rate / mean confidence"""
+
+    def bucket():
+        return {"volume": 0, "handover_count": 0, "confidence_sum": 0.0, "confidence_count": 0}
+
+    def finalize(b):
+        return {
+            "volume": b["volume"],
+            "handover_count": b["handover_count"],
+            "handover_rate": round(b["handover_count"] / b["volume"], 4) if b["volume"] else 0.0,
+            "mean_confidence": round(b["confidence_sum"] / b["confidence_count"], 4) if b["confidence_count"] else None
+        }
+
+    total = bucket()
+    by_day: Dict[str, Dict[str, Any]] = {}
+    by_platform: Dict[str, Dict[str, Any]] = {}
+
+    for row in rows:
+        day_entry = by_day.setdefault(row["day"], {"total": bucket(), "platforms": {}})
+        targets = [
+            total,
+            by_platform.setdefault(row["platform"], bucket()),
+            day_entry["total"],
+            day_entry["platforms"].setdefault(row["platform"], bucket())
+        ]
+        for b in targets:
+            for key in b:
+                b[key] += row[key]
+
+    return {
+        "total": finalize(total),
+        "platforms": {p: finalize(b) for p, b in sorted(by_platform.items())},
+        "daily": [
+            {
+                "day": day,
+                **finalize(entry["total"]),
+                "platforms": {p: finalize(b) for p, b in sorted(entry["platforms"].items())}
+            }
+            for day, entry in sorted(by_day.items())
+        ]
+    }
+
+
+def get_stats(days: int = 30, platform: Optional[str] = None) -> Dict[str, Any]:
+    stats = summarize(get_daily_rollups(days, platform))
+    stats["days"] = days
+    return stats
+
+
+def refresh_rollups(since: Optional[str] = None) -> int:
+    """Rebuild bot_logs_daily from raw logs (initial backfill or repair)"""
+    return supabase.rpc("refresh_bot_logs_daily", {"since": since}).execute().data
+
+
+def purge_logs(retain_days: int) -> int:
+    """Delete raw bot_logs older than retain_days; the daily rollups are kept"""
+    return supabase.rpc("purge_bot_logs", {"retain_days": retain_days}).execute().data
+
+
+def print_stats(stats: Dict[str, Any]):
+    def fmt(s):
+        mean = f"{s['mean_confidence']:.2f}" if s["mean_confidence"] is not None else "n/a"
+        return f"{s['volume']:>8} msgs | handover {s['handover_rate']:>6.1%} | mean conf {mean}"
+
+    print(f"--- Bot Log Stats (last {stats['days']} days) ---")
+    print(f"Total:      {fmt(stats['total'])}")
+    for platform, s in stats["platforms"].items():
+        print(f"  {platform:<10}{fmt(s)}")
+    print("\n--- Daily ---")
+    for day in stats["daily"]:
+        print(f"{day['day']}  {fmt(day)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BookLeaf bot_logs analytics")
+    parser.add_argument("--days", type=int, default=30, help="Window size in days")
+    parser.add_argument("--platform", choices=["web", "whatsapp", "instagram", "email"])
+    parser.add_argument("--refresh", nargs="?", const="", metavar="SINCE", help="Rebuild rollups from raw logs (optionally from YYYY-MM-DD)")
+    parser.add_argument("--purge", type=int, metavar="RETAIN_DAYS", help="Delete raw logs older than RETAIN_DAYS")
+    args = parser.parse_args()
+
+    if args.refresh is not None:
+        print(f"Refreshed {refresh_rollups(args.refresh or None)} rollup rows.")
+    if args.purge is not None:
+        print(f"Purged {purge_logs(args.purge)} raw log rows older than {args.purge} days.")
+
+    print_stats(get_stats(args.days, args.platform))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import json
+import argparse
+import pathlib
+from typing import List, Dict, Any, Optional, Tuple
+import pandas as pd
+
+from identity import supabase, unifier
+
+
+Handle = Tuple[str, str]  # (platform, handle_or_id)
+
+# Statuses re-checked on every run: LLM failures, and fuzzy rejects (cheap to re-score,
+# and the author pool or --min-score may have changed since)
+RETRY_STATUSES = {"error", "below_min_score"}
+
+
+class IdentityBackfill:
+    def __init__(
+        self,
+        state_file: str | pathlib.Path = ".backfill_state.json",
+        batch_size: int = 20,
+        concurrency: int = 4,
+        min_score: float = 40.0,
+        dry_run: bool = False,
+        retry_unresolved: bool = False
+    ):
+        self.state_file = pathlib.Path(state_file)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.min_score = min_score
+        self.dry_run = dry_run
+        self.retry_unresolved = retry_unresolved
+        self.state = self.load_state()
+
+    @staticmethod
+    def state_key(platform: str, handle: str) -> str:
+        return f"{platform}\t{handle}"
+
+    def load_state(self) -> Dict[str, Any]:
+        if self.state_file.exists():
+            return json.loads(self.state_file.read_text(encoding="utf-8"))
+        return {"processed": {}}
+
+    def save_state(self):
+        if self.dry_run:
+            return
+        tmp = self.state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2), encoding="utf-8")
+        tmp.replace(self.state_file)
+
+    def load_handles_from_logs(self, platform: Optional[str] = None, page_size: int = 1000) -> List[Handle]:
+        """Distinct senders in bot_logs that were never tied to an author email"""
+        handles = []
+        after: Optional[Handle] = None
+        while True:
+            # DISTINCT runs in the database (unlinked_log_senders), paged by keyset on (platform, sender)
+            rows = supabase.rpc("unlinked_log_senders", {
+                "platform_filter": platform,
+                "after_platform": after[0] if after else None,
+                "after_sender": after[1] if after else None,
+                "page_size": page_size
+            }).execute().data
+            handles.extend((r['platform_used'], r['sender_id']) for r in rows)
+            if len(rows) < page_size:
+                return handles
+            after = handles[-1]
+
+    def load_handles_from_csv(self, csv_path: str | pathlib.Path, default_platform: Optional[str] = None) -> List[Handle]:
+        """
+        Exported DM lists. Expects a `handle_or_id` (or `handle`) column and an optional
+        `platform` column; rows without a platform fall back to `default_platform`.
+        """
+        df = pd.read_csv(csv_path, dtype=str)
+        handle_col = "handle_or_id" if "handle_or_id" in df.columns else "handle"
+        if handle_col not in df.columns:
+            raise ValueError(f"{csv_path} has no 'handle_or_id' or 'handle' column")
+
+        if "platform" not in df.columns:
+            if not default_platform:
+                raise ValueError(f"{csv_path} has no 'platform' column; pass --platform for this file")
+            df["platform"] = default_platform
+        elif default_platform:
+            df["platform"] = df["platform"].fillna(default_platform)
+
+        df = df.dropna(subset=["platform", handle_col])
+        return list(zip(df["platform"].str.strip(), df[handle_col].str.strip()))
+
+    def pending_handles(self, handles: List[Handle]) -> List[Handle]:
+        """Drop duplicates, handles already linked in the database and handles finished in a previous run"""
+        linked = unifier.get_linked_handles()
+        retry = RETRY_STATUSES | ({"unresolved"} if self.retry_unresolved else set())
+        processed = {k for k, r in self.state["processed"].items() if r["status"] not in retry}
+        seen = set()
+        pending = []
+        for handle in handles:
+            if not handle[1] or handle in seen:
+                continue
+            seen.add(handle)
+            if handle in linked or self.state_key(*handle) in processed:
+                continue
+            pending.append(handle)
+        return pending
+
+    def record(self, platform: str, handle: str, status: str, candidates: List[Dict[str, Any]], resolution: Dict[str, Any]):
+        best = max(candidates, key=lambda c: c['score'], default=None)
+        self.state["processed"][self.state_key(platform, handle)] = {
+            "platform": platform,
+            "handle_or_id": handle,
+            "status": status,
+            "matched_email": resolution.get("matched_email"),
+            "confidence_score": resolution.get("confidence_score", 0),
+            "justification": resolution.get("justification", ""),
+            "best_candidate": best['email'] if best else None,
+            "best_fuzzy_score": best['score'] if best else 0
+        }
+
+    def resolve_platform(self, platform: str, handles: List[str], pool: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+        """Fuzzy-match all handles for one platform at once, then disambiguate the plausible ones in packed prompts"""
+        all_candidates = unifier.batch_fuzzy_match(handles, pool)
+
+        ambiguous = []
+        unresolved = 0
+        for handle, candidates in zip(handles, all_candidates):
+            if not candidates or max(c['score'] for c in candidates) < self.min_score:
+                self.record(platform, handle, "below_min_score", candidates, {"justification": f"No fuzzy candidate scored >= {self.min_score:.0f}"})
+                unresolved += 1
+            else:
+                ambiguous.append((handle, candidates))
+        self.save_state()
+
+        linked = errored = 0
+        round_size = self.batch_size * self.concurrency
+        for start in range(0, len(ambiguous), round_size):
+            chunk = ambiguous[start:start + round_size]
+            groups = [chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size)]
+            resolutions = unifier.llm_disambiguate_batch(platform, groups, max_concurrency=self.concurrency)
+
+            links = []
+            round_errors = 0
+            for (handle, candidates), resolution in zip(chunk, resolutions):
+                if resolution.get("error"):
+                    self.record(platform, handle, "error", candidates, resolution)
+                    round_errors += 1
+                elif resolution.get("confidence_score", 0) >= unifier.confidence_threshold and resolution.get("matched_email"):
+                    links.append({"primary_email": resolution["matched_email"], "platform": platform, "handle_or_id": handle})
+                    self.record(platform, handle, "linked", candidates, resolution)
+                else:
+                    self.record(platform, handle, "unresolved", candidates, resolution)
+
+            failed = 0
+            if not self.dry_run and not unifier.link_identities_bulk(links):
+                # Leave these handles unrecorded so the next run retries them
+                for link in links:
+                    self.state["processed"].pop(self.state_key(platform, link["handle_or_id"]), None)
+                failed = len(links)
+                links = []
+
+            linked += len(links)
+            errored += round_errors
+            unresolved += len(chunk) - len(links) - failed - round_errors
+            self.save_state()
+            print(f"   {platform}: {min(start + round_size, len(ambiguous))}/{len(ambiguous)} disambiguated, {linked} linked, {errored} to retry")
+
+        return linked, unresolved, errored
+
+    def write_report(self, report_path: str | pathlib.Path):
+        rows = [r for r in self.state["processed"].values() if r["status"] != "linked"]
+        columns = ["platform", "handle_or_id", "status", "best_candidate", "best_fuzzy_score", "confidence_score", "justification"]
+        pd.DataFrame(rows, columns=columns).to_csv(report_path, index=False)
+        print(f"📝 Unresolved report ({len(rows)} handles): {report_path}")
+
+    def run(self, handles: List[Handle], report_path: str | pathlib.Path):
+        pending = self.pending_handles(handles)
+        print(f"🚀 {len(handles)} handles loaded, {len(pending)} pending{' (dry run)' if self.dry_run else ''}")
+
+        if pending:
+            pool = unifier.get_all_authors()
+            print(f"   Author pool: {len(pool)} records")
+
+            by_platform: Dict[str, List[str]] = {}
+            for platform, handle in pending:
+                by_platform.setdefault(platform, []).append(handle)
+
+            total_linked = total_unresolved = total_errored = 0
+            for platform, platform_handles in by_platform.items():
+                linked, unresolved, errored = self.resolve_platform(platform, platform_handles, pool)
+                total_linked += linked
+                total_unresolved += unresolved
+                total_errored += errored
+
+            verb = "Would link" if self.dry_run else "Linked"
+            print(f" {verb} {total_linked} handles, {total_unresolved} unresolved, {total_errored} failed (retried on next run).")
+
+        self.write_report(report_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill author_identities for historical senders")
+    parser.add_argument("--from-logs", action="store_true", help="Load unlinked senders from bot_logs")
+    parser.add_argument("--csv", action="append", default=[], help="Exported DM list (platform, handle_or_id columns); repeatable")
+    parser.add_argument("--platform", choices=["web", "whatsapp", "instagram", "email"], help="Restrict log senders / default platform for CSV rows")
+    parser.add_argument("--batch-size", type=int, default=20, help="Handles packed into each disambiguation prompt")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum disambiguation prompts in flight")
+    parser.add_argument("--min-score", type=float, default=40.0, help="Skip the LLM when no fuzzy candidate reaches this score (re-checked every run)")
+    parser.add_argument("--retry-unresolved", action="store_true", help="Send handles the LLM previously rejected through disambiguation again")
+    parser.add_argument("--state-file", default=".backfill_state.json", help="Progress file used to resume interrupted runs")
+    parser.add_argument("--report", default="backfill_unresolved.csv", help="Where to write the unresolved handles report")
+    parser.add_argument("--dry-run", action="store_true", help="Resolve but do not write links or progress")
+    args = parser.parse_args()
+
+    if not args.from_logs and not args.csv:
+        parser.error("provide --from-logs and/or at least one --csv")
+
+    backfill = IdentityBackfill(
+        state_file=args.state_file,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        min_score=args.min_score,
+        retry_unresolved=args.retry_unresolved,
+        dry_run=args.dry_run
+    )
+
+    handles: List[Handle] = []
+    if args.from_logs:
+        handles.extend(backfill.load_handles_from_logs(args.platform))
+    for csv_path in args.csv:
+        handles.extend(backfill.load_handles_from_csv(csv_path, args.platform))
+
+    backfill.run(handles, args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import os
+from typing import List, Dict, Any, Tuple, Optional
+from kb_config import CHUNK_OVERLAP
+
+
+# Gemini averages ~4 characters per token on English prose; close enough for budgeting
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = 1500
+
+# Must cover the splitter's chunk_overlap, plus slack for whitespace the splitter trims
+MAX_OVERLAP_CHARS = CHUNK_OVERLAP + 50
+MIN_OVERLAP_CHARS = 20
+
+# Below this much room for content, blocks after the first are dropped instead of trimmed
+MIN_BLOCK_TOKENS = 25
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_block(source: str, similarity: float, content: str, links: List[str]) -> str:
+    link_str = f"\nRelevant Links: {', '.join(links)}" if links else ""
+    return f"[Source: {source} | Relevance: {similarity:.2f}]\n{content}{link_str}"
+
+
+def format_unpacked(docs: List[Dict[str, Any]]) -> str:
+    """The verbatim layout search_knowledge_base used before packing; the baseline for savings"""
+    blocks = []
+    for doc in docs:
+        metadata = doc.get("metadata") or {}
+        blocks.append(format_block(
+            metadata.get("source_file", "Unknown"),
+            doc.get("similarity", 0),
+            doc.get("content", ""),
+            metadata.get("all_links", [])
+        ))
+    return "\n\n---\n\n".join(blocks)
+
+
+def overlap_length(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right` (0 if below MIN_OVERLAP_CHARS)"""
+    upper = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for k in range(upper, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:k]):
+            return k
+    return 0
+
+
+def merge_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Stitch together chunks from the same source page whose text overlaps (the
+    splitter's chunk_overlap), and drop chunks fully contained in another.
+    """
+    merged = [dict(c) for c in chunks]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(len(merged)):
+                if i == j:
+                    continue
+                a, b = merged[i], merged[j]
+                if b["content"] in a["content"]:
+                    combined = a["content"]
+                else:
+                    k = overlap_length(a["content"], b["content"])
+                    if not k:
+                        continue
+                    combined = a["content"] + b["content"][k:]
+                a["content"] = combined
+                a["similarity"] = max(a["similarity"], b["similarity"])
+                a["links"] = a["links"] + [l for l in b["links"] if l not in a["links"]]
+                del merged[j]
+                changed = True
+                break
+            if changed:
+                break
+    return merged
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + " …"
+
+
+def pack_context(docs: List[Dict[str, Any]], token_budget: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Turn match_documents rows into a compact tool result:
+    merge overlapping neighbours per source page, list each link only once,
+    and fill `token_budget` in order of similarity.
+    Returns the packed text and a stats dict with the bytes/tokens saved.
+    """
+    if token_budget is None:
+        token_budget = int(os.environ.get("KB_CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+    groups: Dict[Tuple[str, Any], List[Dict[str, Any]]] = {}
+    for doc in docs:
+        metadata = doc.get("metadata") or {}
+        source = metadata.get("source_file", "Unknown")
+        groups.setdefault((source, metadata.get("page")), []).append({
+            "source": source,
+            "content": doc.get("content", ""),
+            "similarity": doc.get("similarity", 0),
+            "links": list(dict.fromkeys(metadata.get("all_links", [])))
+        })
+
+    blocks = [b for group in groups.values() for b in merge_chunks(group)]
+    blocks.sort(key=lambda b: b["similarity"], reverse=True)
+
+    separator = "\n\n---\n\n"
+    seen_links = set()
+    packed = []
+    used_tokens = 0
+    for block in blocks:
+        links = [l for l in block["links"] if l not in seen_links]
+        remaining = token_budget - used_tokens - (estimate_tokens(separator) if packed else 0)
+        text = format_block(block["source"], block["similarity"], block["content"], links)
+        if estimate_tokens(text) > remaining:
+            # Trim the content of the block that crosses the budget, keeping header and links intact
+            overhead = estimate_tokens(format_block(block["source"], block["similarity"], "", links))
+            if packed and remaining - overhead < MIN_BLOCK_TOKENS:
+                break
+            # The top block is always emitted, even if its header and links alone exceed the budget
+            content_tokens = max(remaining - overhead, MIN_BLOCK_TOKENS)
+            text = format_block(block["source"], block["similarity"], truncate_to_tokens(block["content"], content_tokens), links)
+        seen_links.update(links)
+        packed.append(text)
+        used_tokens += estimate_tokens(text) + (estimate_tokens(separator) if len(packed) > 1 else 0)
+        if used_tokens >= token_budget:
+            break
+
+    result = separator.join(packed)
+    baseline = format_unpacked(docs)
+    stats = {
+        "chunks_in": len(docs),
+        "blocks_out": len(packed),
+        "bytes_before": len(baseline.encode("utf-8")),
+        "bytes_after": len(result.encode("utf-8")),
+        "tokens_before": estimate_tokens(baseline),
+        "tokens_after": estimate_tokens(result)
+    }
+    stats["bytes_saved"] = stats["bytes_before"] - stats["bytes_after"]
+    stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+    return result, stats
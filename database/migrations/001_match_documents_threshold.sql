@@ -0,0 +1,33 @@
+-- Move the similarity cut (previously `>= 0.5` in tools.search_knowledge_base) and top-k
+-- into match_documents, so filtered rows never leave the database.
+-- tune_retrieval.py writes retrieval_tuning/recommended_migration.sql with tuned defaults
+-- and index settings; apply that afterwards to change them.
+
+DROP FUNCTION IF EXISTS match_documents(VECTOR(768), INT);
+
+CREATE OR REPLACE FUNCTION match_documents (
+    query_embedding VECTOR(768),
+    match_count INT DEFAULT 5,
+    match_threshold FLOAT DEFAULT 0.5
+)
+RETURNS TABLE (
+    id uuid,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        kb.id,
+        kb.content,
+        kb.metadata,
+        1 - (kb.embedding <=> query_embedding) AS similarity
+    FROM knowledge_base kb
+    WHERE (kb.embedding <=> query_embedding) <= 1 - match_threshold
+    ORDER BY kb.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
@@ -32,9 +32,12 @@ USING ivfflat (embedding vector_cosine_ops)
 WITH (lists = 100);
 
 
+DROP FUNCTION IF EXISTS match_documents(VECTOR(768), INT);
+
 CREATE OR REPLACE FUNCTION match_documents (
     query_embedding VECTOR(768),
-    match_count INT DEFAULT 5
+    match_count INT DEFAULT 5,
+    match_threshold FLOAT DEFAULT 0.5
 )
 RETURNS TABLE (
     id uuid,
@@ -52,6 +55,7 @@ BEGIN
         kb.metadata,
         1 - (kb.embedding <=> query_embedding) AS similarity
     FROM knowledge_base kb
+    WHERE (kb.embedding <=> query_embedding) <= 1 - match_threshold
     ORDER BY kb.embedding <=> query_embedding
     LIMIT match_count;
 END;
@@ -74,5 +78,166 @@ CREATE TABLE IF NOT EXISTS bot_logs (
     confidence_score FLOAT,
     platform_used TEXT,
     author_email TEXT,
+    sender_id TEXT,
     created_at TIMESTAMP DEFAULT NOW()
-);
\ No newline at end of file
+);
+
+ALTER TABLE bot_logs ADD COLUMN IF NOT EXISTS sender_id TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_bot_logs_unlinked_senders
+ON bot_logs (platform_used, sender_id)
+WHERE author_email IS NULL AND sender_id IS NOT NULL;
+
+
+-- Distinct unlinked senders for backfill.py, paged by keyset on (platform_used, sender_id)
+CREATE OR REPLACE FUNCTION unlinked_log_senders(
+    platform_filter TEXT DEFAULT NULL,
+    after_platform TEXT DEFAULT NULL,
+    after_sender TEXT DEFAULT NULL,
+    page_size INT DEFAULT 1000
+)
+RETURNS TABLE (
+    platform_used TEXT,
+    sender_id TEXT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT l.platform_used, l.sender_id
+    FROM bot_logs l
+    WHERE l.author_email IS NULL
+      AND l.sender_id IS NOT NULL
+      AND l.platform_used IS NOT NULL
+      AND (platform_filter IS NULL OR l.platform_used = platform_filter)
+      AND (after_platform IS NULL OR (l.platform_used, l.sender_id) > (after_platform, after_sender))
+    ORDER BY l.platform_used, l.sender_id
+    LIMIT page_size;
+$$;
+
+REVOKE EXECUTE ON FUNCTION unlinked_log_senders(TEXT, TEXT, TEXT, INT) FROM PUBLIC, anon, authenticated;
+
+-- bot_logs analytics: an index for retention/refresh, a daily rollup kept
+-- current by trigger, and helpers for purging raw rows and cheap row counts.
+
+-- Used by purge_bot_logs and refresh_bot_logs_daily. btree rather than BRIN: purging
+-- frees old heap pages that new rows then reuse, so physical order stops tracking created_at
+CREATE INDEX IF NOT EXISTS idx_bot_logs_created_at
+ON bot_logs (created_at);
+
+CREATE TABLE IF NOT EXISTS bot_logs_daily (
+    day DATE NOT NULL,
+    platform TEXT NOT NULL,
+    volume BIGINT NOT NULL DEFAULT 0,
+    handover_count BIGINT NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    confidence_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, platform)
+);
+
+
+-- Handover mirrors the agent's 80% confidence threshold (agent.evaluate_response)
+CREATE OR REPLACE FUNCTION bot_logs_rollup_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO bot_logs_daily AS d (day, platform, volume, handover_count, confidence_sum, confidence_count)
+    VALUES (
+        COALESCE(NEW.created_at, NOW())::date,
+        COALESCE(NEW.platform_used, 'unknown'),
+        1,
+        CASE WHEN NEW.confidence_score < 0.80 THEN 1 ELSE 0 END,
+        COALESCE(NEW.confidence_score, 0),
+        CASE WHEN NEW.confidence_score IS NULL THEN 0 ELSE 1 END
+    )
+    ON CONFLICT (day, platform) DO UPDATE SET
+        volume = d.volume + EXCLUDED.volume,
+        handover_count = d.handover_count + EXCLUDED.handover_count,
+        confidence_sum = d.confidence_sum + EXCLUDED.confidence_sum,
+        confidence_count = d.confidence_count + EXCLUDED.confidence_count;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_bot_logs_rollup ON bot_logs;
+CREATE TRIGGER trg_bot_logs_rollup
+AFTER INSERT ON bot_logs
+FOR EACH ROW EXECUTE FUNCTION bot_logs_rollup_insert();
+
+
+-- Rebuild rollups from raw rows (initial backfill, or after manual edits to bot_logs).
+-- Only days that still have raw rows are rebuilt, so purged history is preserved.
+CREATE OR REPLACE FUNCTION refresh_bot_logs_daily(since DATE DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    refreshed INT;
+BEGIN
+    DELETE FROM bot_logs_daily d
+    WHERE (since IS NULL OR d.day >= since)
+      AND EXISTS (
+          SELECT 1 FROM bot_logs l
+          WHERE l.created_at >= d.day AND l.created_at < d.day + 1
+      );
+
+    INSERT INTO bot_logs_daily (day, platform, volume, handover_count, confidence_sum, confidence_count)
+    SELECT
+        l.created_at::date,
+        COALESCE(l.platform_used, 'unknown'),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE l.confidence_score < 0.80),
+        COALESCE(SUM(l.confidence_score), 0),
+        COUNT(l.confidence_score)
+    FROM bot_logs l
+    WHERE since IS NULL OR l.created_at >= since
+    GROUP BY 1, 2
+    ON CONFLICT (day, platform) DO UPDATE SET
+        volume = EXCLUDED.volume,
+        handover_count = EXCLUDED.handover_count,
+        confidence_sum = EXCLUDED.confidence_sum,
+        confidence_count = EXCLUDED.confidence_count;
+
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+    RETURN refreshed;
+END;
+$$;
+
+
+-- Retention: drop raw rows older than retain_days; their aggregates stay in bot_logs_daily
+CREATE OR REPLACE FUNCTION purge_bot_logs(retain_days INT DEFAULT 90)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    purged BIGINT;
+BEGIN
+    DELETE FROM bot_logs
+    WHERE created_at < (CURRENT_DATE - retain_days);
+
+    GET DIAGNOSTICS purged = ROW_COUNT;
+    RETURN purged;
+END;
+$$;
+
+
+-- Planner estimate (pg_class.reltuples): O(1) instead of a full count(*) scan
+CREATE OR REPLACE FUNCTION estimated_row_count(table_name TEXT)
+RETURNS BIGINT
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT GREATEST(c.reltuples, 0)::BIGINT
+    FROM pg_class c
+    WHERE c.oid = to_regclass(table_name);
+$$;
+
+
+-- These live in public, so PostgREST exposes them as RPCs; only service_role
+-- (analytics.py, verify_db.py) may call them
+REVOKE EXECUTE ON FUNCTION refresh_bot_logs_daily(DATE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION purge_bot_logs(INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION estimated_row_count(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION refresh_bot_logs_daily(DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION purge_bot_logs(INT) TO service_role;
+GRANT EXECUTE ON FUNCTION estimated_row_count(TEXT) TO service_role;
@@ -1,6 +1,8 @@
 import os
 import re
-from typing import List, Dict, Any, Optional
+import json
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 from rapidfuzz import fuzz, process
 from dotenv import load_dotenv
 from supabase.client import Client, create_client
@@ -16,14 +18,45 @@ supabase: Client = create_client(supabase_url, supabase_key)
 
 llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0)
 
+
+def parse_llm_json(content: Any) -> Any:
+    """Extract the JSON payload from a Gemini response (handles list content and ``` fences)"""
+    if not isinstance(content, str):
+
+        if isinstance(content, list):
+            content = " ".join(p.get('text', '') for p in content if isinstance(p, dict))
+        else:
+            content = str(content)
+
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+
+
+    try:
+        return json.loads(content.strip())
+    except json.JSONDecodeError:
+
+        match = re.search(r'[\[{].*[\]}]', content, re.DOTALL)
+        if match:
+            return json.loads(match.group())
+        raise
+
 class IdentityUnifier:
     def __init__(self):
         self.confidence_threshold = 85.0 
 
-    def get_all_authors(self) -> List[Dict[str, Any]]:
+    def get_all_authors(self, page_size: int = 1000) -> List[Dict[str, Any]]:
         """Retrieve all primary authors from the database for matching pool"""
-        response = supabase.table("author_status").select("email, book_title").execute()
-        return response.data
+        authors = []
+        start = 0
+        while True:
+            response = supabase.table("author_status").select("email, book_title").order("email").range(start, start + page_size - 1).execute()
+            authors.extend(response.data)
+            if len(response.data) < page_size:
+                return authors
+            start += page_size
 
     def fuzzy_match_author(self, input_identifier: str, pool: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
@@ -44,6 +77,41 @@ class IdentityUnifier:
             
         return candidates
 
+    def batch_fuzzy_match(self, identifiers: List[str], pool: List[Dict[str, Any]], limit: int = 2, chunk_size: int = 500) -> List[List[Dict[str, Any]]]:
+        """
+        Vectorized fuzzy_match_author: scores identifiers against the pool with cdist,
+        `chunk_size` identifiers at a time so the score matrices stay small.
+        """
+        if not identifiers or not pool:
+            return [[] for _ in identifiers]
+
+        emails = [a['email'] for a in pool]
+        titles = [a['book_title'] for a in pool]
+        limit = min(limit, len(pool))
+
+        all_candidates = []
+        for start in range(0, len(identifiers), chunk_size):
+            chunk = identifiers[start:start + chunk_size]
+            email_scores = process.cdist(chunk, emails, scorer=fuzz.partial_ratio, workers=-1)
+            title_scores = process.cdist(chunk, titles, scorer=fuzz.WRatio, workers=-1)
+
+            per_field = []
+            for scores in (email_scores, title_scores):
+                # argpartition finds the top `limit` per row in O(pool); only those few get sorted
+                top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                order = np.argsort(-top_scores, axis=1, kind="stable")
+                per_field.append((np.take_along_axis(top, order, axis=1), scores))
+
+            for row in range(len(chunk)):
+                candidates = []
+                for (top, scores), reason in zip(per_field, ("Email Match", "Title Match")):
+                    for idx in top[row]:
+                        candidates.append({"email": pool[idx]['email'], "score": float(scores[row, idx]), "reason": reason})
+                all_candidates.append(candidates)
+
+        return all_candidates
+
     def llm_disambiguate(self, input_identifier: str, platform: str, candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
 
         if not candidates:
@@ -79,34 +147,117 @@ class IdentityUnifier:
                 "identifier": input_identifier,
                 "candidates_list": candidates_str
             })
-            import json, re
-
-            content = response.content
-            if not isinstance(content, str):
-
-                if isinstance(content, list):
-                    content = " ".join(p.get('text', '') for p in content if isinstance(p, dict))
-                else:
-                    content = str(content)
-                
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
+            return parse_llm_json(response.content)
+        except Exception as e:
+            return {"email": None, "confidence": 0, "reason": f"LLM Error: {str(e)}"}
 
-            try:
-                result = json.loads(content.strip())
-            except json.JSONDecodeError:
+    def llm_disambiguate_batch(self, platform: str, items: List[Tuple[str, List[Dict[str, Any]]]], max_concurrency: int = 4) -> List[Dict[str, Any]]:
+        """
+        Disambiguate many handles at once. Each element of `items` is a group of
+        (handle, candidates) pairs packed into a single prompt; groups run in parallel
+        with at most `max_concurrency` requests in flight. Returns one result per handle.
+        """
+        prompt = ChatPromptTemplate.from_template("""
+        You are an Identity Unification Specialist at BookLeaf Publishing.
+        Task: Link each user handle from {platform} to an existing author profile.
+        
+        Each handle below is numbered and listed with its own potential database candidates:
+        {handles_list}
+        
+        For every handle, decide independently whether there is a high probability (above 85%) that it belongs to one of ITS candidates.
+        A handle like '@sarapoetry23' likely belongs to 'sara.johnson@xyz.com'.
+        Only choose an email from that handle's own candidate list.
+        
+        Return a JSON array with exactly one object per handle, in the same order:
+        [
+            {{
+                "index": the handle's number,
+                "matched_email": "email or null",
+                "confidence_score": 0-100,
+                "justification": "Short reason why"
+            }}
+        ]
+        """)
+
+        def format_group(group):
+            blocks = []
+            for number, (handle, candidates) in enumerate(group, 1):
+                candidates_str = "\n".join([f"    - {c['email']} (Fuzzy Score: {c['score']:.0f}, Match Logic: {c['reason']})" for c in candidates])
+                blocks.append(f"[{number}] Handle: {handle}\n{candidates_str}")
+            return "\n\n".join(blocks)
+
+        chain = prompt | llm
+        responses = chain.batch(
+            [{"platform": platform, "handles_list": format_group(group)} for group in items],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True
+        )
 
-                match = re.search(r'\{.*\}', content, re.DOTALL)
-                if match:
-                    result = json.loads(match.group())
-                else:
-                    raise
-            return result
+        results = []
+        for group, response in zip(items, responses):
+            parsed: Dict[int, Dict[str, Any]] = {}
+            error = None
+            if isinstance(response, Exception):
+                error = f"LLM Error: {str(response)}"
+            else:
+                try:
+                    payload = parse_llm_json(response.content)
+                    if isinstance(payload, dict):
+                        payload = [payload]
+                    payload = [r for r in payload if isinstance(r, dict)]
+                    for position, r in enumerate(payload, 1):
+                        try:
+                            parsed[int(r["index"])] = r
+                        except (KeyError, TypeError, ValueError):
+                            # No usable index; trust the order only if every handle came back
+                            if len(payload) == len(group):
+                                parsed[position] = r
+                except Exception as e:
+                    error = f"LLM Error: {str(e)}"
+
+            for number, (handle, candidates) in enumerate(group, 1):
+                result = parsed.get(number)
+                if result is None:
+                    # Transient (quota, timeout, bad JSON, dropped handle): callers should retry, not give up
+                    results.append({"matched_email": None, "confidence_score": 0, "justification": error or "Missing from LLM response", "error": True})
+                    continue
+                try:
+                    confidence = float(result.get("confidence_score") or 0)
+                except (TypeError, ValueError):
+                    confidence = 0.0
+                result = {**result, "confidence_score": confidence}
+                # Reject emails the model invented rather than picked from the candidate list
+                allowed = {c['email'] for c in candidates}
+                if result.get("matched_email") not in allowed:
+                    result = {**result, "matched_email": None, "confidence_score": 0.0}
+                results.append(result)
+
+        return results
+
+    def get_linked_handles(self, platform: Optional[str] = None, page_size: int = 1000) -> set:
+        """Return the set of (platform, handle_or_id) pairs already present in author_identities"""
+        linked = set()
+        start = 0
+        while True:
+            query = supabase.table("author_identities").select("platform, handle_or_id").order("id")
+            if platform:
+                query = query.eq("platform", platform)
+            rows = query.range(start, start + page_size - 1).execute().data
+            linked.update((r['platform'], r['handle_or_id']) for r in rows)
+            if len(rows) < page_size:
+                return linked
+            start += page_size
+
+    def link_identities_bulk(self, links: List[Dict[str, str]]) -> bool:
+        """Insert many {primary_email, platform, handle_or_id} rows in one request; existing links are never overwritten"""
+        if not links:
+            return True
+        try:
+            supabase.table("author_identities").upsert(links, on_conflict="platform,handle_or_id", ignore_duplicates=True).execute()
+            return True
         except Exception as e:
-            return {"email": None, "confidence": 0, "reason": f"LLM Error: {str(e)}"}
+            print(f"Error bulk linking identities: {e}")
+            return False
 
     def link_identity(self, email: str, platform: str, handle_or_id: str):
        
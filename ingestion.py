@@ -9,27 +9,31 @@ from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_community.vectorstores import SupabaseVectorStore
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from supabase.client import Client, create_client
+from kb_config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, CHUNK_SIZE, CHUNK_OVERLAP
 
 
 load_dotenv()
 
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_SERVICE_KEY")
-
-if not supabase_url or not supabase_key:
-    raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in .env file")
-
-supabase: Client = create_client(supabase_url, supabase_key)
-
 
 embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/gemini-embedding-001",
+    model=EMBEDDING_MODEL,
     task_type="retrieval_document",
-    output_dimensionality=768
+    output_dimensionality=EMBEDDING_DIMENSIONS
     )
 
+
+def get_supabase_client() -> Client:
+    """Created on upload only, so the loader/splitter can be used without database credentials"""
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_SERVICE_KEY")
+
+    if not supabase_url or not supabase_key:
+        raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in .env file")
+
+    return create_client(supabase_url, supabase_key)
+
 class KnowledgeBaseIngestor:
-    def __init__(self, data_dir: str | pathlib.Path):
+    def __init__(self, data_dir: str | pathlib.Path, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
         self.data_dir = pathlib.Path(data_dir)
         
         self.link_scanner = re.compile(
@@ -39,8 +43,8 @@ class KnowledgeBaseIngestor:
         )
  
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=150,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", " ", ""]
         )
 
@@ -59,8 +63,8 @@ class KnowledgeBaseIngestor:
             print(f"⚠️ Error extracting links from {pdf_path.name}: {e}")
         return list(set(links))
 
-    def process_pdf(self, pdf_path: pathlib.Path) -> List[Any]:
-        
+    def load_pdf(self, pdf_path: pathlib.Path) -> List[Any]:
+        """Load one PDF as page documents tagged with source_file and all_links (before splitting)"""
         print(f"🔗 Processing: {pdf_path.name}")
         
         native_links = self.extract_native_links(pdf_path)
@@ -75,8 +79,11 @@ class KnowledgeBaseIngestor:
             doc.metadata["all_links"] = list(set(native_links + extracted_text_links))
             doc.metadata["source_file"] = pdf_path.name
 
-       
-        return self.text_splitter.split_documents(documents)
+        return documents
+
+    def process_pdf(self, pdf_path: pathlib.Path) -> List[Any]:
+        
+        return self.text_splitter.split_documents(self.load_pdf(pdf_path))
 
     def run_ingestion(self):
         
@@ -105,7 +112,7 @@ class KnowledgeBaseIngestor:
             SupabaseVectorStore.from_documents(
                 all_chunks,
                 embeddings,
-                client=supabase,
+                client=get_supabase_client(),
                 table_name="knowledge_base",
                 query_name="match_documents"
             )
@@ -0,0 +1,13 @@
+# Knowledge-base settings shared by ingestion, search (tools.py), context packing
+# and the retrieval tuning harness. Update these when applying a tune_retrieval.py
+# recommendation, then re-run ingestion.
+
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_DIMENSIONS = 768
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+
+# Sent explicitly to match_documents; keep in step with the migration's defaults
+MATCH_COUNT = 5
+MATCH_THRESHOLD = 0.5
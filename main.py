@@ -1,8 +1,9 @@
 import os
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional
 from agent import run_customer_bot
+from analytics import get_stats
 
 app = FastAPI(title="BookLeaf Publishing AI Automation API")
 
@@ -44,6 +45,17 @@ async def chat_endpoint(request: ChatRequest):
 async def health_check():
     return {"status": "online", "service": "BookLeaf AI Agent"}
 
+@app.get("/stats")
+async def stats_endpoint(days: int = Query(30, ge=1, le=366), platform: Optional[str] = None):
+    """
+    Operational stats (volume, handover rate, mean confidence) per day and platform.
+    Served from the bot_logs_daily rollups, so cost does not grow with bot_logs.
+    """
+    try:
+        return get_stats(days=days, platform=platform)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,96 @@
+from context_packer import (
+    CHARS_PER_TOKEN,
+    estimate_tokens,
+    merge_chunks,
+    overlap_length,
+    pack_context,
+)
+
+
+TEXT = " ".join(f"word{i}" for i in range(600))
+
+
+def make_doc(content, similarity, source="Royalty-related queries.pdf", page=0, links=None):
+    return {
+        "content": content,
+        "similarity": similarity,
+        "metadata": {"source_file": source, "page": page, "all_links": links or []},
+    }
+
+
+def make_chunk(content, similarity=0.5, links=None):
+    return {"source": "a.pdf", "content": content, "similarity": similarity, "links": links or []}
+
+
+def test_overlap_length_finds_splitter_overlap():
+    assert overlap_length(TEXT[:1000], TEXT[850:1850]) == 150
+
+
+def test_overlap_length_ignores_short_coincidences():
+    assert overlap_length("the royalty is paid", "paid monthly") == 0
+
+
+def test_merge_chunks_stitches_adjacent_chunks_in_either_order():
+    merged = merge_chunks([make_chunk(TEXT[850:1850], 0.8, ["https://b"]), make_chunk(TEXT[:1000], 0.6, ["https://a"])])
+    assert len(merged) == 1
+    assert merged[0]["content"] == TEXT[:1850]
+    assert merged[0]["similarity"] == 0.8
+    assert sorted(merged[0]["links"]) == ["https://a", "https://b"]
+
+
+def test_merge_chunks_drops_contained_chunk():
+    merged = merge_chunks([make_chunk(TEXT[:1000]), make_chunk(TEXT[100:400])])
+    assert [c["content"] for c in merged] == [TEXT[:1000]]
+
+
+def test_merge_chunks_keeps_unrelated_chunks():
+    assert len(merge_chunks([make_chunk(TEXT[:500]), make_chunk(TEXT[2000:2500])])) == 2
+
+
+def test_pack_context_merges_only_within_same_source_page():
+    docs = [
+        make_doc(TEXT[:1000], 0.9),
+        make_doc(TEXT[850:1850], 0.8),
+        make_doc(TEXT[850:1850], 0.7, source="Limitations.pdf"),
+    ]
+    packed, stats = pack_context(docs, token_budget=10_000)
+    assert stats["chunks_in"] == 3
+    assert stats["blocks_out"] == 2
+    assert TEXT[:1850] in packed
+    assert stats["bytes_saved"] > 0
+
+
+def test_pack_context_lists_each_link_once_and_orders_by_similarity():
+    links = ["https://dashboard.bookleafpub.in", "https://ebooks.bookleafpub.com/sales-reports"]
+    docs = [
+        make_doc("Sales reports are updated monthly.", 0.6, page=1, links=links),
+        make_doc("Royalties are paid once earnings cross a threshold.", 0.9, page=2, links=links + ["https://extra"]),
+    ]
+    packed, _ = pack_context(docs, token_budget=10_000)
+    assert packed.index("Royalties are paid") < packed.index("Sales reports")
+    for link in links + ["https://extra"]:
+        assert packed.count(link) == 1
+
+
+def test_pack_context_trims_to_budget():
+    docs = [make_doc(TEXT[:1000], 0.9, page=1), make_doc(TEXT[2000:3000], 0.8, page=2), make_doc(TEXT[4000:5000], 0.7, page=3)]
+    packed, stats = pack_context(docs, token_budget=300)
+    assert estimate_tokens(packed) <= 300 + 2
+    assert stats["blocks_out"] < 3
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_pack_context_always_emits_top_block():
+    long_links = [f"https://example.com/{'x' * 40}/{i}" for i in range(20)]
+    docs = [make_doc(TEXT[:1000], 0.9, links=long_links)]
+    packed, stats = pack_context(docs, token_budget=50)
+    assert stats["blocks_out"] == 1
+    assert packed.startswith("[Source: Royalty-related queries.pdf | Relevance: 0.90]")
+    assert "word0" in packed
+    assert len(packed) < len(TEXT[:1000]) + len(", ".join(long_links)) + 100 + 50 * CHARS_PER_TOKEN
+
+
+def test_pack_context_empty_input():
+    packed, stats = pack_context([], token_budget=100)
+    assert packed == ""
+    assert stats["blocks_out"] == 0
@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 from langchain_core.tools import tool
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from supabase.client import Client, create_client
+from context_packer import pack_context
+from kb_config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, MATCH_COUNT, MATCH_THRESHOLD
 
 
 load_dotenv()
@@ -18,9 +20,9 @@ supabase: Client = create_client(supabase_url, supabase_key)
 
 
 embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/gemini-embedding-001",
+    model=EMBEDDING_MODEL,
     task_type="retrieval_query",
-    output_dimensionality=768
+    output_dimensionality=EMBEDDING_DIMENSIONS
     )
 
 
@@ -35,31 +37,28 @@ def search_knowledge_base(query: str) -> str:
         # Generate query embedding using the same model as ingestion
         query_embedding = embeddings.embed_query(query)
         
-       
+        # Passing match_threshold fails loudly if database/migrations was not applied
         result = supabase.rpc("match_documents", {
             "query_embedding": query_embedding,
-            "match_count": 5
+            "match_count": MATCH_COUNT,
+            "match_threshold": MATCH_THRESHOLD
         }).execute()
         
-        if not result.data:
+        # The server already filters; this guards against a misconfigured function
+        docs = [doc for doc in result.data or [] if doc.get("similarity", 0) >= MATCH_THRESHOLD]
+        if not docs:
             return "No specific information found in the Knowledge Base for this query."
         
-        # Client-side filter: only keep chunks with similarity >= 0.5
-        filtered = [doc for doc in result.data if doc.get("similarity", 1) >= 0.5]
-        if not filtered:
+        # Merge overlapping chunks, de-duplicate links and cap the result at the token budget
+        packed, stats = pack_context(docs)
+        if not packed:
             return "No specific information found in the Knowledge Base for this query."
-        
-        formatted_results = []
-        for doc in filtered:
-            content = doc.get("content", "")
-            metadata = doc.get("metadata", {})
-            source = metadata.get("source_file", "Unknown")
-            similarity = doc.get("similarity", 0)
-            links = metadata.get("all_links", [])
-            link_str = f"\nRelevant Links: {', '.join(links)}" if links else ""
-            formatted_results.append(f"[Source: {source} | Relevance: {similarity:.2f}]\n{content}{link_str}")
-            
-        return "\n\n---\n\n".join(formatted_results)
+        print(
+            f"📦 KB context: {stats['chunks_in']} chunks -> {stats['blocks_out']} blocks, "
+            f"saved {stats['bytes_saved']} bytes / ~{stats['tokens_saved']} tokens "
+            f"({stats['tokens_before']} -> {stats['tokens_after']})"
+        )
+        return packed
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -93,7 +92,7 @@ def check_author_status(email: str) -> str:
         return f"Error querying author status: {str(e)}"
 
 @tool
-def log_interaction_to_supabase(query: str, response: str, confidence: float, email: Optional[str] = None, platform: str = "web"):
+def log_interaction_to_supabase(query: str, response: str, confidence: float, email: Optional[str] = None, platform: str = "web", sender_id: Optional[str] = None):
     """
     Logs the user query, bot response, confidence score, and platform to the database for audit and human escalation tracking.
     Required by the assignment to monitor the 80% confidence threshold.
@@ -104,7 +103,8 @@ def log_interaction_to_supabase(query: str, response: str, confidence: float, em
             "response": response,
             "confidence_score": confidence,
             "author_email": email,
-            "platform_used": platform
+            "platform_used": platform,
+            "sender_id": sender_id
         }
         supabase.table("bot_logs").insert(log_entry).execute()
         return "Interaction logged successfully to Supabase."
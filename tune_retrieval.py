@@ -0,0 +1,398 @@
+import re
+import json
+import time
+import hashlib
+import argparse
+import pathlib
+import tempfile
+from itertools import product
+from typing import List, Dict, Any, Tuple
+import numpy as np
+import pandas as pd
+
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+# ingestion creates its Supabase client only when uploading, so this import needs no database credentials
+from ingestion import KnowledgeBaseIngestor, embeddings as document_embeddings
+from kb_config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, CHUNK_SIZE, CHUNK_OVERLAP
+
+
+# Same settings as tools.search_knowledge_base, built here so the harness never imports tools (and its Supabase client)
+query_embeddings = GoogleGenerativeAIEmbeddings(
+    model=EMBEDDING_MODEL,
+    task_type="retrieval_query",
+    output_dimensionality=EMBEDDING_DIMENSIONS
+    )
+
+
+BASE_DIR = pathlib.Path(__file__).parent
+KNOWLEDGE_BASE_DIR = BASE_DIR / "knowledge_base"
+TUNING_DIR = BASE_DIR / "retrieval_tuning"
+
+
+def parse_list(value: str, cast=int) -> List[Any]:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def normalize_text(text: str) -> str:
+    # PDFs exported from Docs are full of zero-width spaces around bullets
+    return re.sub(r"\s+", " ", text.replace("\u200b", " ")).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Disk cache of embeddings keyed by sha256(task + text), so re-running the
+    harness (or trying a new chunking) only embeds text it hasn't seen before.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.vectors: Dict[str, np.ndarray] = {}
+        if path.exists():
+            data = np.load(path)
+            self.vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    @staticmethod
+    def key(task: str, text: str) -> str:
+        return hashlib.sha256(f"{task}\n{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str], task: str) -> np.ndarray:
+        keys = [self.key(task, t) for t in texts]
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in self.vectors))
+        if missing:
+            print(f"   Embedding {len(missing)} new {task} texts...")
+            model = document_embeddings if task == "document" else query_embeddings
+            vectors = model.embed_documents(missing) if task == "document" else [model.embed_query(t) for t in missing]
+            for text, vector in zip(missing, vectors):
+                self.vectors[self.key(task, text)] = np.asarray(vector, dtype=np.float32)
+            self.save()
+
+        matrix = np.stack([self.vectors[k] for k in keys])
+        # Cosine similarity == dot product once rows are unit length (768-d Gemini outputs are not pre-normalized)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        keys = list(self.vectors)
+        np.savez(self.path, keys=np.array(keys), vectors=np.stack([self.vectors[k] for k in keys]))
+
+
+class ExactIndex:
+    """Brute-force cosine search: the ground truth, and what pgvector does with no ANN index"""
+    name = "exact"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def params(self) -> Dict[str, Any]:
+        return {}
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        sims = self.vectors @ query
+        top = np.argsort(-sims)[:k]
+        return top, sims[top]
+
+    def size_bytes(self) -> int:
+        return 0
+
+
+class IVFFlatIndex:
+    """Local model of pgvector ivfflat: k-means lists, search the `probes` nearest lists exactly"""
+    name = "ivfflat"
+
+    def __init__(self, vectors: np.ndarray, lists: int, probes: int, seed: int = 0, iterations: int = 20):
+        self.vectors = vectors
+        self.lists = lists
+        self.probes = probes
+        n_lists = min(lists, len(vectors))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = vectors[assignment == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / np.linalg.norm(centroid)
+        self.centroids = centroids
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self.members = [np.flatnonzero(assignment == c) for c in range(n_lists)]
+
+    def params(self) -> Dict[str, Any]:
+        return {"lists": self.lists, "probes": self.probes}
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        nearest_lists = np.argsort(-(self.centroids @ query))[:self.probes]
+        candidates = np.concatenate([self.members[c] for c in nearest_lists])
+        sims = self.vectors[candidates] @ query
+        top = np.argsort(-sims)[:k]
+        return candidates[top], sims[top]
+
+    def size_bytes(self) -> int:
+        # pgvector keeps a full copy of each vector in its list, plus the centroids
+        return int((len(self.vectors) + len(self.centroids)) * self.vectors.shape[1] * 4)
+
+
+class HNSWIndex:
+    """pgvector hnsw equivalent (m, ef_construction, hnsw.ef_search) via hnswlib"""
+    name = "hnsw"
+
+    def __init__(self, vectors: np.ndarray, m: int, ef_construction: int, ef_search: int, seed: int = 0):
+        import hnswlib
+
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), ef_construction=ef_construction, M=m, random_seed=seed)
+        self.index.add_items(vectors, np.arange(len(vectors)))
+
+    def params(self) -> Dict[str, Any]:
+        return {"m": self.m, "ef_construction": self.ef_construction, "ef_search": self.ef_search}
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.index.get_current_count())
+        self.index.set_ef(max(self.ef_search, k))
+        labels, distances = self.index.knn_query(query, k=k)
+        return labels[0], 1 - distances[0]
+
+    def size_bytes(self) -> int:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "index.bin"
+            self.index.save_index(str(path))
+            return path.stat().st_size
+
+
+class RetrievalTuner:
+    def __init__(self, data_dir: pathlib.Path, questions_path: pathlib.Path, cache_path: pathlib.Path):
+        self.data_dir = data_dir
+        self.questions = json.loads(questions_path.read_text(encoding="utf-8"))
+        self.cache = EmbeddingCache(cache_path)
+        loader = KnowledgeBaseIngestor(data_dir)
+        self.pages = []
+        for pdf in sorted(data_dir.glob("*.pdf")):
+            self.pages.extend(loader.load_pdf(pdf))
+        self.query_vectors = self.cache.embed([q["question"] for q in self.questions], task="query")
+
+    def chunk(self, chunk_size: int, chunk_overlap: int) -> List[Any]:
+        ingestor = KnowledgeBaseIngestor(self.data_dir, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return ingestor.text_splitter.split_documents(self.pages)
+
+    def relevance(self, chunks: List[Any]) -> List[set]:
+        """Per question, the chunk ids from the labelled source that contain one of the answer phrases"""
+        texts = [normalize_text(c.page_content) for c in chunks]
+        relevant = []
+        for q in self.questions:
+            phrases = [normalize_text(p) for p in q["answer_contains"]]
+            relevant.append({
+                i for i, c in enumerate(chunks)
+                if c.metadata.get("source_file") == q["source_file"] and any(p in texts[i] for p in phrases)
+            })
+        return relevant
+
+    def build_indexes(self, vectors: np.ndarray, args) -> List[Any]:
+        indexes = [ExactIndex(vectors)]
+        for lists, probes in product(args.ivf_lists, args.ivf_probes):
+            if probes <= lists:
+                indexes.append(IVFFlatIndex(vectors, lists, probes))
+
+        if args.hnsw_m:
+            try:
+                for m, ef_search in product(args.hnsw_m, args.hnsw_ef_search):
+                    indexes.append(HNSWIndex(vectors, m, args.hnsw_ef_construction, ef_search))
+            except ImportError:
+                print("⚠️ hnswlib is not installed; skipping HNSW candidates (pip install hnswlib)")
+        return indexes
+
+    def evaluate_index(self, index, relevant: List[set], exact_top: List[np.ndarray], top_ks: List[int], thresholds: List[float]) -> List[Dict[str, Any]]:
+        max_k = max(top_ks)
+        results = []
+        start = time.perf_counter()
+        for query in self.query_vectors:
+            results.append(index.search(query, max_k))
+        latency_ms = (time.perf_counter() - start) * 1000 / len(self.query_vectors)
+
+        rows = []
+        for k, threshold in product(top_ks, thresholds):
+            hits, reciprocal_ranks, returned, ann_recall = [], [], [], []
+            for (ids, sims), rel, exact in zip(results, relevant, exact_top):
+                kept = [int(i) for i, s in zip(ids[:k], sims[:k]) if s >= threshold]
+                returned.append(len(kept))
+                rank = next((r for r, i in enumerate(kept, 1) if i in rel), None)
+                hits.append(rank is not None)
+                reciprocal_ranks.append(1 / rank if rank else 0.0)
+                ann_recall.append(len(set(ids[:k].tolist()) & set(exact[:k].tolist())) / k)
+            rows.append({
+                "index": index.name,
+                "index_params": json.dumps(index.params()),
+                "top_k": k,
+                "threshold": threshold,
+                "recall@k": round(float(np.mean(hits)), 4),
+                "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+                "ann_recall": round(float(np.mean(ann_recall)), 4),
+                "avg_returned": round(float(np.mean(returned)), 2),
+                "latency_ms": round(latency_ms, 4),
+                "index_bytes": index.size_bytes()
+            })
+        return rows
+
+    def run(self, args) -> pd.DataFrame:
+        rows = []
+        for chunk_size, chunk_overlap in product(args.chunk_sizes, args.chunk_overlaps):
+            if chunk_overlap >= chunk_size:
+                continue
+            chunks = self.chunk(chunk_size, chunk_overlap)
+            print(f"🔧 chunk_size={chunk_size} overlap={chunk_overlap}: {len(chunks)} chunks")
+            vectors = self.cache.embed([c.page_content for c in chunks], task="document")
+            relevant = self.relevance(chunks)
+            unanswerable = sum(1 for r in relevant if not r)
+            if unanswerable:
+                print(f"   {unanswerable} questions have no chunk containing their answer phrase at this chunking")
+
+            exact = ExactIndex(vectors)
+            exact_top = [exact.search(q, max(args.top_k))[0] for q in self.query_vectors]
+            for index in self.build_indexes(vectors, args):
+                for row in self.evaluate_index(index, relevant, exact_top, args.top_k, args.thresholds):
+                    rows.append({"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "chunks": len(chunks), **row})
+
+        return pd.DataFrame(rows)
+
+
+def recommend(results: pd.DataFrame, min_ann_recall: float = 0.95, recall_tolerance: float = 0.05, min_threshold: float = 0.5) -> Dict[str, Any]:
+    """
+    recall@k here is a hit rate, so it only grows with larger k and lower thresholds.
+    Candidates must keep a similarity cut of at least `min_threshold` and agree with exact
+    search at least `min_ann_recall` of the time. Any configuration within `recall_tolerance`
+    of the best recall@k is acceptable; among those, the one returning the fewest chunks
+    (prompt cost) wins, then higher MRR, lower latency and a smaller index.
+    """
+    eligible = results[(results.ann_recall >= min_ann_recall) & (results.threshold >= min_threshold)]
+    if eligible.empty:
+        raise ValueError(f"No candidate has threshold >= {min_threshold} and ann_recall >= {min_ann_recall}")
+    shortlist = eligible[eligible["recall@k"] >= eligible["recall@k"].max() - recall_tolerance]
+    ranked = shortlist.sort_values(
+        ["avg_returned", "mrr", "latency_ms", "index_bytes"],
+        ascending=[True, False, True, True]
+    )
+    best = json.loads(ranked.iloc[[0]].to_json(orient="records"))[0]
+    best["index_params"] = json.loads(best["index_params"])
+    return best
+
+
+def render_migration(best: Dict[str, Any]) -> str:
+    params = best["index_params"]
+    if best["index"] == "ivfflat":
+        index_sql = (
+            "CREATE INDEX idx_knowledge_base_embedding\n"
+            "ON knowledge_base\n"
+            "USING ivfflat (embedding vector_cosine_ops)\n"
+            f"WITH (lists = {params['lists']});"
+        )
+        search_setting = f"    PERFORM set_config('ivfflat.probes', '{params['probes']}', true);\n"
+    elif best["index"] == "hnsw":
+        index_sql = (
+            "CREATE INDEX idx_knowledge_base_embedding\n"
+            "ON knowledge_base\n"
+            "USING hnsw (embedding vector_cosine_ops)\n"
+            f"WITH (m = {params['m']}, ef_construction = {params['ef_construction']});"
+        )
+        search_setting = f"    PERFORM set_config('hnsw.ef_search', '{params['ef_search']}', true);\n"
+    else:
+        index_sql = "-- Exact search won: at this table size a sequential scan beats any ANN index, so none is created."
+        search_setting = ""
+
+    return f"""-- Generated by tune_retrieval.py
+-- Recommended: chunk_size={best['chunk_size']}, chunk_overlap={best['chunk_overlap']}, index={best['index']} {json.dumps(params)},
+--              top_k={best['top_k']}, threshold={best['threshold']}
+-- recall@k={best['recall@k']}, mrr={best['mrr']}, avg_returned={best['avg_returned']}, latency_ms={best['latency_ms']}
+--
+-- If chunk_size/chunk_overlap differ from CHUNK_SIZE={CHUNK_SIZE}/CHUNK_OVERLAP={CHUNK_OVERLAP} in kb_config.py,
+-- update them there (KnowledgeBaseIngestor and context_packer's overlap merging both read
+-- these values) and re-run ingestion.py (after clearing knowledge_base) before applying this migration.
+-- Also set MATCH_COUNT={best['top_k']} and MATCH_THRESHOLD={best['threshold']} in kb_config.py; search_knowledge_base
+-- passes them explicitly, so the defaults below only apply to other callers.
+
+DROP INDEX IF EXISTS idx_knowledge_base_embedding;
+
+{index_sql}
+
+DROP FUNCTION IF EXISTS match_documents(VECTOR(768), INT);
+DROP FUNCTION IF EXISTS match_documents(VECTOR(768), INT, FLOAT);
+
+CREATE OR REPLACE FUNCTION match_documents (
+    query_embedding VECTOR(768),
+    match_count INT DEFAULT {best['top_k']},
+    match_threshold FLOAT DEFAULT {best['threshold']}
+)
+RETURNS TABLE (
+    id uuid,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+{search_setting}    RETURN QUERY
+    SELECT
+        kb.id,
+        kb.content,
+        kb.metadata,
+        1 - (kb.embedding <=> query_embedding) AS similarity
+    FROM knowledge_base kb
+    WHERE (kb.embedding <=> query_embedding) <= 1 - match_threshold
+    ORDER BY kb.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune chunking and vector-index parameters against a labelled question set")
+    parser.add_argument("--questions", default=str(TUNING_DIR / "questions.json"))
+    parser.add_argument("--data-dir", default=str(KNOWLEDGE_BASE_DIR))
+    parser.add_argument("--cache", default=str(TUNING_DIR / ".cache" / "embeddings.npz"))
+    parser.add_argument("--out-dir", default=str(TUNING_DIR))
+    parser.add_argument("--chunk-sizes", type=parse_list, default=[500, 750, 1000, 1500])
+    parser.add_argument("--chunk-overlaps", type=parse_list, default=[0, 75, 150])
+    parser.add_argument("--top-k", type=parse_list, default=[1, 3, 5, 8])
+    parser.add_argument("--thresholds", type=lambda v: parse_list(v, float), default=[0.0, 0.5, 0.6, 0.7])
+    parser.add_argument("--ivf-lists", type=parse_list, default=[1, 5, 10, 100])
+    parser.add_argument("--ivf-probes", type=parse_list, default=[1, 3, 10])
+    parser.add_argument("--hnsw-m", type=parse_list, default=[8, 16])
+    parser.add_argument("--hnsw-ef-construction", type=int, default=64)
+    parser.add_argument("--hnsw-ef-search", type=parse_list, default=[10, 40])
+    parser.add_argument("--min-ann-recall", type=float, default=0.95, help="Minimum agreement with exact search for a recommendable index")
+    parser.add_argument("--recall-tolerance", type=float, default=0.05, help="Accept recall@k this far below the best to save prompt tokens")
+    parser.add_argument("--min-threshold", type=float, default=0.5, help="Lowest similarity cut the recommendation may use")
+    args = parser.parse_args()
+
+    out_dir = pathlib.Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    tuner = RetrievalTuner(pathlib.Path(args.data_dir), pathlib.Path(args.questions), pathlib.Path(args.cache))
+    results = tuner.run(args)
+    results.to_csv(out_dir / "results.csv", index=False)
+
+    best = recommend(results, args.min_ann_recall, args.recall_tolerance, args.min_threshold)
+    (out_dir / "recommended.json").write_text(json.dumps(best, indent=2), encoding="utf-8")
+    (out_dir / "recommended_migration.sql").write_text(render_migration(best), encoding="utf-8")
+
+    columns = ["chunk_size", "chunk_overlap", "index", "index_params", "top_k", "threshold", "recall@k", "mrr", "ann_recall", "avg_returned", "latency_ms", "index_bytes"]
+    current = results[
+        (results.chunk_size == CHUNK_SIZE) & (results.chunk_overlap == CHUNK_OVERLAP) & (results["index"] == "ivfflat")
+        & (results.index_params == json.dumps({"lists": 100, "probes": 1})) & (results.top_k == 5) & (results.threshold == 0.5)
+    ]
+    if not current.empty:
+        print(f"\n--- Current configuration ({CHUNK_SIZE}/{CHUNK_OVERLAP}, ivfflat lists=100 probes=1, k=5, >= 0.5) ---")
+        print(current[columns].to_string(index=False))
+    print("\n--- Top candidates ---")
+    print(results.sort_values(["recall@k", "mrr", "avg_returned", "latency_ms"], ascending=[False, False, True, True])[columns].head(10).to_string(index=False))
+    print(f"\n✅ Recommended: {json.dumps(best)}")
+    print(f"   Results: {out_dir / 'results.csv'}\n   Migration: {out_dir / 'recommended_migration.sql'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import argparse
 from dotenv import load_dotenv
 from supabase.client import Client, create_client
 
@@ -7,15 +8,22 @@ supabase_url = os.environ.get("SUPABASE_URL")
 supabase_key = os.environ.get("SUPABASE_SERVICE_KEY")
 supabase: Client = create_client(supabase_url, supabase_key)
 
-def verify_data():
-    kb_count = supabase.table("knowledge_base").select("id", count="exact").execute()
-    status_count = supabase.table("author_status").select("email", count="exact").execute()
-    log_count = supabase.table("bot_logs").select("id", count="exact").execute()
-    
-    print(f"--- Database Status ---")
-    print(f"Knowledge Base Chunks: {kb_count.count}")
-    print(f"Author Records: {status_count.count}")
-    print(f"Interaction Logs: {log_count.count}")
+def verify_data(estimate: bool = False):
+    tables = [("knowledge_base", "id"), ("author_status", "email"), ("bot_logs", "id")]
+
+    if estimate:
+        # Planner statistics instead of count="exact", which scans the whole table
+        counts = {t: supabase.rpc("estimated_row_count", {"table_name": t}).execute().data for t, _ in tables}
+    else:
+        counts = {t: supabase.table(t).select(col, count="exact").limit(1).execute().count for t, col in tables}
+
+    print(f"--- Database Status{' (estimated)' if estimate else ''} ---")
+    print(f"Knowledge Base Chunks: {counts['knowledge_base']}")
+    print(f"Author Records: {counts['author_status']}")
+    print(f"Interaction Logs: {counts['bot_logs']}")
 
 if __name__ == "__main__":
-    verify_data()
+    parser = argparse.ArgumentParser(description="BookLeaf database health check")
+    parser.add_argument("--estimate", action="store_true", help="Use fast planner estimates instead of exact counts")
+    args = parser.parse_args()
+    verify_data(estimate=args.estimate)